@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+
+"""
+Differential checking of knot engines against the reference Knot class.
+
+An "engine" is anything that looks like knots.Knot: it can be called with a
+list of pivots, and has TH() and Layers() classmethods, and its instances have
+pivots, strands(), pathbetween(), pointsbetween(), slopebetween() and
+svgout().  Usually it'll be a subclass of Knot with some methods replaced by
+faster ones.  We throw random knots at the reference and at each engine and
+complain (with the smallest example we can find) if they ever disagree.
+"""
+
+import sys
+import random
+import timeit
+import itertools
+from fractions import gcd
+from math import factorial
+
+import knots
+
+# Cases that the comments in knots.py call out, always checked first.
+EDGECASES=[
+    # The 9x3 where both pivots are on both lines (see slopebetween)
+    ('TH', (9,3)),
+    ('TH', (3,4)),
+    ('TH', (1,1)),
+    # The irregular-bottom conundrum; comes out as not tyable.
+    ('pivots', [(0,2),(0,0),(4,2),(4,0),(5,17),(5,13),(5,9),(5,5),(8,2),
+                (8,0),(11,17),(11,13),(11,9),(11,5),(12,2),(12,0)]),
+    ('pivots', [(0,0),(1,9),(2,4),(3,13),(4,0),(5,9),(6,4),(7,13),(8,0),
+                (9,9),(10,4),(11,13),(12,0),(13,9),(14,4),(15,13)]),
+    # The irregular one found experimenting.
+    ('pivots', [(1,1),(2,4),(3,1),(4,16),(5,1),(6,10),(6,4),(7,1),(9,9),
+                (9,1),(10,4),(11,1),(13,9),(13,1),(15,1),(16,8),(17,1),
+                (19,1),(21,11),(21,7),(21,1),(22,4),(23,1),(25,1),(26,4),
+                (27,1),(28,16),(28,12),(29,1),(30,6),(30,4),(31,1)]),
+    # Patrick's.
+    ('pivots', [(0,0),(1,13),(2,0),(3,17),(4,0),(5,13),(6,0),(7,33),(8,0),
+                (9,13),(10,0),(11,17),(12,0),(13,13),(14,0),(15,33),(16,0),
+                (17,13),(18,0),(19,17),(20,0),(21,13),(22,0),(23,33),(24,0),
+                (25,13),(26,0),(27,17),(28,0),(29,13),(30,0),(31,33),(32,0),
+                (33,13),(34,0),(35,17),(36,0),(37,13),(38,0),(39,33),(40,0),
+                (41,13),(42,0),(43,17),(44,0),(45,13),(46,0),(47,33)]),
+    ('layers', [(4,1),(4,3)]),
+    ('layers', [(6,1),(3,4)]),
+    ]
+
+def randomTH(rnd):
+    return ('TH', (rnd.randint(1,9), rnd.randint(1,9)))
+
+def randomlayers(rnd, limit=500):
+    """Small layered knots; Layers() is an exhaustive search, so keep the
+number of knots it has to try under limit."""
+    while True:
+        layers=[(rnd.randint(2,8), rnd.randint(1,8))
+                for i in range(0,rnd.randint(1,2))]
+        total=sum([e[0] for e in layers])
+        if any([gcd(total,e[0])<2 for e in layers]):
+            continue
+        if layerstries(layers)<=limit:
+            return ('layers', layers)
+
+def layerstries(layers):
+    "How many knots Knot.Layers(layers) will build and try."
+    total=sum([e[0] for e in layers])
+    rv=1
+    for (number, height) in layers:
+        sections=gcd(total,number)
+        (size, howmany)=(total/sections, number/sections)
+        rv*=factorial(size)/(factorial(howmany)*factorial(size-howmany))
+    return rv
+
+def randomirregular(rnd, tries=500):
+    """A TH with some of its top pivots moved up or down, or else a bunch of
+points thrown down more or less at random.  Most of those aren't tyable, and
+an untyable knot only gets as far as comparing error messages, so keep going
+until the reference can find its strands (or we run out of tries)."""
+    for i in range(0,tries):
+        if rnd.random()<0.5:
+            pts=perturbedTH(rnd)
+        else:
+            pts=scatter(rnd)
+        try:
+            knots.Knot(pts).strands()
+        except Exception:
+            continue
+        break
+    return ('pivots', pts)
+
+def perturbedTH(rnd):
+    "A TH with at least one of its top pivots moved."
+    leads=rnd.randint(1,9)
+    bights=rnd.randint(2,9)
+    pts=zip(range(0,2*bights,2),[0]*bights) + \
+        zip(range(leads%2,2*bights,2),[leads]*bights)
+    moved=False
+    while not moved:
+        for i in range(bights,len(pts)):
+            if rnd.random()<0.3:
+                (x,y)=pts[i]
+                # Moves are even, so the lowest we can go keeps the parity.
+                newy=max(2-leads%2,y+2*rnd.randint(-2,2))
+                moved=moved or newy!=y
+                pts[i]=(x,newy)
+    return pts
+
+def scatter(rnd):
+    "A flat bottom and the rest of the pivots thrown down anywhere."
+    width=rnd.randint(2,8)
+    pts=set([(x,0) for x in range(0,2*width,2)])
+    while len(pts)<2*width:
+        y=rnd.randint(1,3*width)
+        x=2*rnd.randint(0,width-1)+y%2
+        pts.add((x,y))
+    pts=list(pts)
+    rnd.shuffle(pts)
+    return pts
+
+GENERATORS=[randomTH, randomlayers, randomirregular]
+
+def build(engine, case, clock):
+    "Return the list of knots an engine makes of the case."
+    (kind, args)=case
+    if kind=='TH':
+        return [timedcall(clock,engine.TH,*args)]
+    if kind=='layers':
+        # Layers() hands back a set; put it in some order we can compare.
+        # Knot.Layers() makes plain Knots whatever class it's called on, so
+        # only trust it for the pivots, and make the knots over again with
+        # the engine.
+        found=sorted(timedcall(clock,engine.Layers,args), key=pivottuples)
+        return [timedcall(clock,engine,pivottuples(k)) for k in found]
+    return [timedcall(clock,engine,args)]
+
+def pivottuples(knot):
+    return [(p.x,p.y) for p in knot.pivots]
+
+def pointtuples(lst):
+    return [(p.x,p.y) for p in lst]
+
+def canonicalcircuit(circuit):
+    """strands() picks its starting points out of a set, so the same circuit
+can come back rotated or backwards.  Use the smallest of all of those."""
+    forms=[]
+    for seq in (circuit, circuit[::-1]):
+        for i in range(0,len(seq)):
+            forms.append(seq[i:]+seq[:i])
+    return min(forms, key=pointtuples)
+
+def timedcall(clock, fn, *args):
+    """Call fn, adding the time it takes to clock[0].  Only the engine's own
+work goes through here, so the harness doesn't water down the speedups."""
+    start=timeit.default_timer()
+    try:
+        return fn(*args)
+    finally:
+        clock[0]+=timeit.default_timer()-start
+
+def outcome(clock, fn, *args):
+    "Run fn (timed), turning an exception into something comparable."
+    try:
+        return ('ok', timedcall(clock,fn,*args))
+    except Exception, e:
+        return ('error', e.__class__.__name__, str(e))
+
+def knotreport(knot, clock, svg=True):
+    "Everything we compare about a single knot, as plain data."
+    rv={'pivots': pivottuples(knot)}
+    res=outcome(clock,knot.strands)
+    if res[0]!='ok':
+        rv['strands']=res
+        return rv
+    strands=sorted([canonicalcircuit(c) for c in res[1]], key=pointtuples)
+    rv['strands']=('ok', [pointtuples(c) for c in strands])
+    # Paths and in-between points, edge by edge, as svgout walks them (but
+    # always in the canonical direction).
+    edges=[]
+    hits=dict()
+    for circuit in strands:
+        for i in range(0,len(circuit)):
+            here=circuit[i]
+            nxt=circuit[(i+1)%len(circuit)]
+            slope=outcome(clock,knot.slopebetween,here,nxt)
+            path=outcome(clock,knot.pathbetween,here,nxt)
+            if path[0]=='ok':
+                path=('ok', pointtuples(path[1]))
+            between=outcome(clock,knot.pointsbetween,here,nxt)
+            if between[0]=='ok':
+                for p in between[1]:
+                    hits[(p.x,p.y)]=hits.get((p.x,p.y),0)+1
+                between=('ok', pointtuples(between[1]))
+            edges.append(((here.x,here.y),(nxt.x,nxt.y),slope,path,between))
+    rv['edges']=edges
+    # The crossing table: lattice points more than one strand goes through.
+    rv['crossings']=sorted([(p,n) for (p,n) in hits.items() if n>1])
+    if svg and svgavailable():
+        for (key, kwargs) in [('svg', {}), ('circsvg', {'circradius':2})]:
+            res=outcome(clock,lambda: knot.svgout(**kwargs))
+            if res[0]=='ok':
+                res=('ok', normalsvg(res[1],len(strands)))
+            rv[key]=res
+    return rv
+
+def svgavailable():
+    return hasattr(knots, 'SVGdraw')
+
+def normalsvg(svgobj, nstrands):
+    """svgout()'s result as a canonical tree, so that it can be compared.
+Sibling order and number formatting are thrown away; so is the stroke color of
+multistrand knots, since which strand gets which color depends on set
+ordering.  For the same reason a strand can be drawn in either direction, so
+paths are compared as sets of undirected segments."""
+    from xml.dom import minidom
+    d=knots.SVGdraw.drawing()
+    d.svg=svgobj
+    doc=minidom.parseString(d.toXml())
+    def canon(node):
+        if node.nodeType==node.TEXT_NODE:
+            return ('#text', node.data.strip())
+        if node.nodeType!=node.ELEMENT_NODE:
+            return None
+        attrs=[]
+        for (k,v) in node.attributes.items():
+            if k=='stroke' and node.tagName=='path' and nstrands>1:
+                continue
+            if k=='d' and node.tagName=='path':
+                attrs.append((k,canonpath(v)))
+            else:
+                attrs.append((k,canonnumbers(v)))
+        kids=[canon(c) for c in node.childNodes]
+        kids=[c for c in kids if c is not None and c!=('#text','')]
+        return (node.tagName, tuple(sorted(attrs)), tuple(sorted(kids)))
+    return canon(doc.documentElement)
+
+def canonnumbers(s):
+    "Reformat all the numbers in an attribute value the same way."
+    words=[]
+    for w in s.replace(',',' ').split():
+        try:
+            words.append("%.6f"%float(w))
+        except ValueError:
+            words.append(w)
+    return " ".join(words)
+
+def canonpath(d):
+    """Turn path data (only M and L, as svgout() writes it) into a sorted
+list of undirected segments."""
+    segments=[]
+    here=None
+    words=d.replace(',',' ').split()
+    i=0
+    while i<len(words):
+        cmd=words[i]
+        pt=("%.6f"%float(words[i+1]), "%.6f"%float(words[i+2]))
+        if cmd=='L':
+            segments.append(tuple(sorted([here,pt])))
+        elif cmd!='M':
+            # Nothing else is expected; leave it as it is, then.
+            return canonnumbers(d)
+        here=pt
+        i+=3
+    return " ".join(["%s,%s-%s,%s"%(a+b) for (a,b) in sorted(segments)])
+
+def svgdifference(a, b, where=""):
+    """Walk two trees from normalsvg() and describe the first place they
+differ, without printing the whole of either."""
+    (atag, aattrs, akids)=a
+    (btag, battrs, bkids)=b
+    where="%s/%s"%(where,atag)
+    if atag!=btag:
+        return "%s: <%s> != <%s>"%(where, atag, btag)
+    if aattrs!=battrs:
+        for (k,v) in sorted(set(aattrs)^set(battrs)):
+            return "%s: %s=%s only in %s"%(where, k, v,
+                                            "first" if (k,v) in aattrs
+                                            else "second")
+    extra=[k for k in akids if k not in bkids]
+    missing=[k for k in bkids if k not in akids]
+    if len(akids)==len(bkids) and len(extra)==1 and \
+            extra[0][0]==missing[0][0]:
+        # One child differs, and it's the same sort of thing: go into it.
+        if extra[0][0]=='#text':
+            return "%s: text %s != %s"%(where, extra[0][1], missing[0][1])
+        return svgdifference(extra[0],missing[0],where)
+    def brief(node):
+        if node[0]=='#text':
+            return "text %s"%node[1]
+        return "<%s %s> (%d children)"% \
+            (node[0], " ".join(["%s=%s"%kv for kv in node[1]]), len(node[2]))
+    rv="%s: children differ (%d and %d)"%(where, len(akids), len(bkids))
+    if extra:
+        rv+="\n\t  only in first: %s"%brief(extra[0])
+    if missing:
+        rv+="\n\t  only in second: %s"%brief(missing[0])
+    return rv
+
+def report(engine, case, svg=True, clock=None):
+    """Run the case through the engine and describe what came out.  The time
+spent in the engine is added to clock[0], if there is a clock."""
+    if clock is None:
+        clock=[0.0]
+    try:
+        found=build(engine,case,clock)
+    except Exception, e:
+        return ('error', e.__class__.__name__, str(e))
+    return ('ok', [knotreport(k,clock,svg) for k in found])
+
+def difference(a, b):
+    "Return a short description of where two reports first differ, or None."
+    if a==b:
+        return None
+    if a[0]!=b[0] or a[0]!='ok':
+        return "outcome: %s != %s"%(str(a),str(b))
+    if len(a[1])!=len(b[1]):
+        return "number of knots: %d != %d"%(len(a[1]),len(b[1]))
+    for (ka,kb) in zip(a[1],b[1]):
+        for key in sorted(set(ka.keys()+kb.keys())):
+            (va, vb)=(ka.get(key), kb.get(key))
+            if va!=vb and key in ('svg','circsvg') and \
+                    va and vb and va[0]==vb[0]=='ok':
+                return "%s of %s: %s"%(key, str(ka['pivots']),
+                                       svgdifference(va[1],vb[1]))
+            if va!=vb:
+                return "%s of %s: %s"%(key, str(ka['pivots']),
+                                       listdifference(va,vb))
+    return "reports differ"
+
+def listdifference(a, b):
+    "Just the first differing item, if a and b are lists of the same length."
+    if isinstance(a,tuple) and isinstance(b,tuple) and a[0]==b[0]=='ok':
+        (a, b)=(a[1], b[1])
+    if isinstance(a,list) and isinstance(b,list) and len(a)==len(b):
+        for i in range(0,len(a)):
+            if a[i]!=b[i]:
+                return "[%d] %s != %s"%(i, str(a[i]), str(b[i]))
+    return "%s != %s"%(str(a), str(b))
+
+def shrinks(case):
+    "Generate cases smaller than this one, smallest changes last."
+    (kind, args)=case
+    if kind=='TH':
+        (leads, bights)=args
+        if leads>1:
+            yield ('TH', (leads-1,bights))
+        if bights>1:
+            yield ('TH', (leads,bights-1))
+        try:
+            yield ('pivots', pivottuples(knots.Knot.TH(leads,bights)))
+        except Exception:
+            pass
+    elif kind=='layers':
+        for i in range(0,len(args)):
+            yield ('layers', args[:i]+args[i+1:])
+        for i in range(0,len(args)):
+            (n,h)=args[i]
+            if h>1:
+                yield ('layers', args[:i]+[(n,h-1)]+args[i+1:])
+        # A shrunk layers case may be one the reference can't handle.
+        try:
+            found=sorted(knots.Knot.Layers(args), key=pivottuples)
+        except Exception:
+            found=[]
+        for k in found:
+            yield ('pivots', pivottuples(k))
+    else:
+        # Drop pivots, in pairs first to keep the count even.
+        for (i,j) in itertools.combinations(range(0,len(args)),2):
+            yield ('pivots', [p for (n,p) in enumerate(args)
+                              if n!=i and n!=j])
+        for i in range(0,len(args)):
+            yield ('pivots', args[:i]+args[i+1:])
+
+def shrink(engine, case, svg=True):
+    "Return the smallest case we can find that the engine still gets wrong."
+    def fails(c):
+        # report() turns errors from the knot code into outcomes, so the
+        # reference raising where the engine doesn't (or differently) still
+        # counts as a failure.  Cases that break the harness itself, like an
+        # empty pivot list leaving a Knot with no pivots, don't count.
+        try:
+            return difference(report(knots.Knot,c,svg),
+                              report(engine,c,svg)) is not None
+        except Exception:
+            return False
+    progress=True
+    while progress:
+        progress=False
+        for smaller in shrinks(case):
+            if smaller[1] and fails(smaller):
+                case=smaller
+                progress=True
+                break
+    return case
+
+def check(engines, count=100, seed=None, svg=True, out=sys.stdout):
+    """Run the edge cases and count random ones through the reference and
+every engine (a dict of name: engine).  Return a dict of name: (failures,
+speedup), where failures are (shrunk case, description) pairs and speedup is
+the ratio of total reference time to total engine time.
+
+The reference is always run twice and checked against itself first, under the
+name 'reference', since a comparison that isn't stable there is no good for
+anything else.  With no seed, one is picked; it's printed either way."""
+    if seed is None:
+        seed=random.randint(0,999999)
+    rnd=random.Random(seed)
+    if svg and not svgavailable():
+        print >>out, "WARNING: SVGdraw not found, SVG output NOT compared"
+        svg=False
+    svgnote="" if svg else " (SVG not compared)"
+    cases=EDGECASES+[rnd.choice(GENERATORS)(rnd) for i in range(0,count)]
+    results={}
+    refs=[]
+    reftime=[0.0]
+    unstable=[]
+    for case in cases:
+        ref=report(knots.Knot,case,svg,reftime)
+        diff=difference(ref,report(knots.Knot,case,svg))
+        if diff is not None:
+            unstable.append((case, diff))
+            print >>out, "reference: UNSTABLE %s\n\t%s"%(str(case), diff)
+        refs.append(ref)
+    print >>out, "reference: %d cases, %d unstable, seed %d%s"% \
+        (len(cases), len(unstable), seed, svgnote)
+    results['reference']=(unstable, 1.0)
+    for name in sorted(engines.keys()):
+        engine=engines[name]
+        failures=[]
+        enginetime=[0.0]
+        for (case, ref) in zip(cases, refs):
+            got=report(engine,case,svg,enginetime)
+            diff=difference(ref,got)
+            if diff is not None:
+                small=shrink(engine,case,svg)
+                diff=difference(report(knots.Knot,small,svg),
+                                report(engine,small,svg)) or diff
+                failures.append((small, diff))
+                print >>out, "%s: FAILED %s\n\t(from %s)\n\t%s"% \
+                    (name, str(small), str(case), diff)
+        if enginetime[0]:
+            speedup=reftime[0]/enginetime[0]
+        else:
+            speedup=float('inf')
+        print >>out, "%s: %d cases, %d failures, speedup %.2fx, seed %d%s"% \
+            (name, len(cases), len(failures), speedup, seed, svgnote)
+        results[name]=(failures, speedup)
+    return results
+
+def loadengine(spec):
+    "module:Name --> the engine object"
+    (module, name)=spec.split(':')
+    return getattr(__import__(module), name)
+
+def usage():
+    print """Usage: %s [opts] [module:Engine ...]
+\t-h/--help
+\t[-n count] [-s seed] [-x] module:Engine ...
+
+  -h --help:\t\t\tPrint this usage information
+  -n --count=num:\t\tNumber of random cases (default 100)
+  -s --seed=num:\t\tRandom seed
+  -x --no-svg:\t\t\tDon't compare SVG output
+
+The reference is always checked against itself first, to show the
+comparison is stable; with no engines that's all that happens.  SVG
+comparison needs SVGdraw.
+"""%sys.argv[0]
+
+if __name__=='__main__':
+    from getopt import getopt
+    (options, argv)=getopt(sys.argv[1:],"hn:s:x",
+                           ["help","count=","seed=","no-svg"])
+    opts={e[0]:e[1] for e in options}
+    if opts.has_key("-h") or opts.has_key("--help"):
+        usage()
+        exit(0)
+    count=int(opts.get("-n") or opts.get("--count") or 100)
+    seed=opts.get("-s") or opts.get("--seed")
+    if seed is not None:
+        seed=int(seed)
+    svg=not (opts.has_key("-x") or opts.has_key("--no-svg"))
+    engines={spec: loadengine(spec) for spec in argv}
+    results=check(engines,count,seed,svg)
+    if any([r[0] for r in results.values()]):
+        exit(1)